@@ -1,11 +1,67 @@
 import click
+import os
+import stat
 from pathlib import Path
 from mkvresort.helper import (
-    files_in_dir,
+    files_in_dir_iter,
     read_json,
 )
 
 
+def _stat_mode(path) -> int | None:
+    """
+    Returns the file mode of the given path with a single stat call.
+
+    Parameters:
+        path (str or Path): The path to stat.
+
+    Returns:
+        int or None: The file mode of the path, or None if the path does not exist.
+    """
+
+    try:
+        return os.stat(path).st_mode
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+
+
+def _expand_to_input_batches(ctx, value: tuple, value_name: str) -> tuple:
+    """
+    Matches the given values to the input batches, repeating a single value for every input batch.
+
+    Parameters:
+        ctx (click.Context): The current click context.
+        value (tuple): The values given for the parameter.
+        value_name (str): The name of the values, used in the error message.
+
+    Returns:
+        tuple: The values to be enumerated, one for every input batch.
+
+    Raises:
+        click.BadParameter: If more than one value is given and the amount of values does not equal the amount of
+        input values.
+    """
+
+    # The input path option is eager, so it has always been processed at this point
+    amount_of_current_param_values = len(value)
+    amount_of_input_values = len(ctx.params["input_path"])
+
+    # Either give 1 value or same exact amount as input values.
+    if (
+        amount_of_input_values != amount_of_current_param_values
+        and amount_of_current_param_values != 1
+    ):
+        raise click.BadParameter(
+            f"The amount of input values ({amount_of_input_values}) does not "
+            f"equal amount of {value_name} values ({amount_of_current_param_values})."
+        )
+
+    if amount_of_input_values != amount_of_current_param_values:
+        return value * amount_of_input_values
+
+    return value
+
+
 class InputPathChecker:
     def __call__(self, ctx, param, value):
         if value is None:
@@ -15,21 +71,22 @@ class InputPathChecker:
         for batch_number, path in enumerate(value):
             current_batch = {"batch": batch_number + 1}
             p = Path(path)
-            if p.exists():
-                if p.is_file():
+            mode = _stat_mode(p)
+            if mode is not None:
+                if stat.S_ISREG(mode):
                     current_batch = {
                         **current_batch,
                         "input": {"given": path, "resolved": [p]},
                     }
-                elif p.is_dir():
-                    files = files_in_dir(p)
-                    amount_of_files_in_directory = len(files)
-                    if amount_of_files_in_directory == 0:
+                elif stat.S_ISDIR(mode):
+                    files = files_in_dir_iter(p)
+                    first_file = next(files, None)
+                    if first_file is None:
                         raise click.BadParameter("No files found in directory")
 
                     current_batch = {
                         **current_batch,
-                        "input": {"given": path, "resolved": files},
+                        "input": {"given": path, "resolved": [first_file, *files]},
                     }
                 else:
                     raise click.BadParameter("Not a file or directory")
@@ -45,45 +102,36 @@ class OutputPathChecker:
         if value is None:
             raise click.BadParameter("No path provided")
 
-        amount_of_current_param_values = len(value)
-        input_path = ctx.params.get("input_path")
-        if input_path is None:
-            input_path_checker = InputPathChecker()
-            input_path = input_path_checker(ctx, param, ["./input"])
-
-        amount_of_input_values = len(input_path)
-
-        if (
-            amount_of_input_values != amount_of_current_param_values
-            and amount_of_current_param_values != 1
-        ):
-            raise click.BadParameter(
-                f"The amount of input values ({amount_of_input_values}) does not "
-                f"equal amount of output values ({amount_of_current_param_values})."
-            )
+        to_be_enumerated = _expand_to_input_batches(ctx, value, "output")
 
-        to_be_enumerated = value
-        if amount_of_input_values != amount_of_current_param_values:
-            to_be_enumerated = value * amount_of_input_values
+        # Directories that are known to exist, checked once for all batches
+        existing_directories: set[Path] = set()
 
         results = []
         for batch_number, path in enumerate(to_be_enumerated):
             current_batch = {"batch": batch_number + 1}
             p = Path(path)
             if p.suffix:
-                if not p.parent.is_dir():
-                    raise FileNotFoundError(
-                        f"The parent directory `{str(p.parent)}` "
-                        f"for output argument `{str(p)}` does not exist."
-                    )
-                else:
-                    current_batch = {
-                        **current_batch,
-                        "output": {"given": path, "resolved": p},
-                    }
+                if p.parent not in existing_directories:
+                    parent_mode = _stat_mode(p.parent)
+                    if parent_mode is None or not stat.S_ISDIR(parent_mode):
+                        raise FileNotFoundError(
+                            f"The parent directory `{str(p.parent)}` "
+                            f"for output argument `{str(p)}` does not exist."
+                        )
+                    existing_directories.add(p.parent)
+
+                current_batch = {
+                    **current_batch,
+                    "output": {"given": path, "resolved": p},
+                }
             else:
-                if not p.is_dir():
-                    p.mkdir()
+                if p not in existing_directories:
+                    mode = _stat_mode(p)
+                    if mode is None or not stat.S_ISDIR(mode):
+                        p.mkdir()
+                    existing_directories.add(p)
+
                 current_batch = {
                     **current_batch,
                     "output": {"given": path, "resolved": p},
@@ -98,39 +146,25 @@ class PresetPathChecker:
         if value is None:
             raise click.BadParameter("No path provided")
 
-        amount_of_current_param_values = len(value)
-        input_path = ctx.params.get("input_path")
-        if input_path is None:
-            input_path_checker = InputPathChecker()
-            input_path = input_path_checker(ctx, param, ["./input"])
-
-        amount_of_input_values = len(input_path)
-
-        # Either give 1 value or same exact amount as input values.
-        if (
-            amount_of_input_values != amount_of_current_param_values
-            and amount_of_current_param_values != 1
-        ):
-            raise click.BadParameter(
-                f"The amount of input values ({amount_of_input_values}) does not "
-                f"equal amount of preset values ({amount_of_current_param_values})."
-            )
+        to_be_enumerated = _expand_to_input_batches(ctx, value, "preset")
 
-        to_be_enumerated = value
-        if amount_of_input_values != amount_of_current_param_values:
-            to_be_enumerated = value * amount_of_input_values
-
-        results = []
-        for batch_number, path in enumerate(to_be_enumerated):
-            current_batch: dict = {"batch": batch_number + 1}
+        # Parse each unique preset once, and share it between the batches using it
+        parsed_presets = {}
+        for path in dict.fromkeys(value):
             p = Path(path)
-            if p.exists():
-                if p.is_file():
-                    current_batch = {**current_batch, param.name: read_json(p)}
+            mode = _stat_mode(p)
+            if mode is not None:
+                if stat.S_ISREG(mode):
+                    parsed_presets[path] = read_json(p)
                 else:
                     raise click.BadParameter("Not a file")
             else:
                 raise click.BadParameter("Path does not exist")
-            results.append(current_batch)
+
+        results = []
+        for batch_number, path in enumerate(to_be_enumerated):
+            results.append(
+                {"batch": batch_number + 1, param.name: parsed_presets[path]}
+            )
 
         return results
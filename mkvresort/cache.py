@@ -0,0 +1,182 @@
+import hashlib
+import json
+import os
+import tempfile
+from pathlib import Path
+
+
+def default_cache_directory() -> Path:
+    """
+    Returns the default directory for storing cached MKVmerge identify results.
+
+    Returns:
+        Path: The `mkvresort/identify` directory inside `$XDG_CACHE_HOME`, or `~/.cache` if it is not set.
+    """
+
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home().joinpath(".cache")
+
+    return Path(cache_home).joinpath("mkvresort", "identify")
+
+
+class IdentifyCache:
+    VERSION = 2
+
+    def __init__(self, logger, directory: Path | None = None, max_entries=4096):
+        """
+        Initializes a new instance of the IdentifyCache class.
+
+        Args:
+            logger (Logger): The logger object used for logging messages.
+            directory (Path, optional): The directory in which cache entries are stored. Defaults to the
+            directory returned by `default_cache_directory`.
+            max_entries (int, optional): The maximum amount of entries kept on disk. Defaults to 4096.
+
+        Initializes the following instance variables:
+            - logger (Logger): The logger object used for logging messages.
+            - directory (Path): The directory in which cache entries are stored.
+            - max_entries (int): The maximum amount of entries kept on disk.
+            - persistent (bool): Whether entries are stored on disk.
+        """
+        self.logger = logger
+        self.directory = (
+            directory if directory is not None else default_cache_directory()
+        )
+        self.max_entries = max_entries
+        self.persistent = True
+
+    @staticmethod
+    def _stat_key(input_file: Path) -> tuple:
+        """
+        Returns the cache key for the given file, consisting of the absolute path, modification time and size.
+
+        Args:
+            input_file (Path): The path to the file.
+
+        Returns:
+            tuple: The absolute path, modification time in nanoseconds and size of the file.
+        """
+
+        stat_result = os.stat(input_file)
+
+        return (
+            os.path.abspath(input_file),
+            stat_result.st_mtime_ns,
+            stat_result.st_size,
+        )
+
+    def _entry_path(self, absolute_path: str) -> Path:
+        """
+        Returns the path of the cache entry for the given absolute file path.
+
+        Args:
+            absolute_path (str): The absolute path of the file.
+
+        Returns:
+            Path: The path of the cache entry.
+        """
+
+        digest = hashlib.sha1(absolute_path.encode("utf-8"), usedforsecurity=False)
+
+        return self.directory.joinpath(digest.hexdigest() + ".json")
+
+    def get(self, input_file: Path, backends: tuple) -> dict | None:
+        """
+        Returns the cached streams for the given file if the file has not changed since it was cached.
+
+        Args:
+            input_file (Path): The path to the file.
+            backends (tuple): The backends of which cached streams are accepted, e.g. ("mkvmerge",).
+
+        Returns:
+            dict or None: The cached streams, or None if there is no valid cache entry.
+        """
+
+        if not self.persistent:
+            return None
+
+        key = self._stat_key(input_file)
+        entry_path = self._entry_path(key[0])
+        try:
+            with entry_path.open("r") as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            return None
+
+        if entry.get("version") != self.VERSION or entry.get("stat") != list(key[1:]):
+            return None
+
+        if entry.get("backend") not in backends:
+            return None
+
+        try:
+            # Bump modification time, which is used for evicting the least recently used entries
+            os.utime(entry_path)
+        except OSError:
+            pass
+
+        return entry["streams"]
+
+    def set(self, input_file: Path, streams: dict, backend: str) -> None:
+        """
+        Stores the streams for the given file in the cache.
+
+        Args:
+            input_file (Path): The path to the file.
+            streams (dict): The identified streams of the file.
+            backend (str): The backend that identified the streams, e.g. "mkvmerge".
+
+        Returns:
+            None
+        """
+
+        if not self.persistent:
+            return
+
+        key = self._stat_key(input_file)
+
+        entry = {
+            "version": self.VERSION,
+            "stat": list(key[1:]),
+            "backend": backend,
+            "streams": streams,
+        }
+        temporary_file = None
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile(
+                "w", dir=self.directory, suffix=".tmp", delete=False
+            ) as file:
+                temporary_file = file.name
+                json.dump(entry, file)
+            os.replace(temporary_file, self._entry_path(key[0]))
+        except OSError as error:
+            if temporary_file is not None:
+                try:
+                    os.unlink(temporary_file)
+                except OSError:
+                    pass
+
+            self.persistent = False
+            self.logger.warning(
+                f"Unable to write to cache directory `{self.directory}`, caching on disk is disabled: {error}"
+            )
+
+    def prune(self) -> None:
+        """
+        Removes the least recently used entries from disk when there are more than `max_entries` entries.
+
+        Returns:
+            None
+        """
+
+        if not self.persistent:
+            return
+
+        try:
+            entries = sorted(
+                self.directory.glob("*.json"), key=lambda p: p.stat().st_mtime_ns
+            )
+            for entry_path in entries[: max(len(entries) - self.max_entries, 0)]:
+                entry_path.unlink(missing_ok=True)
+        except OSError:
+            pass
@@ -1,28 +1,232 @@
 import click
+import functools
+import operator
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from mkvresort.process import ProcessCommand
 from loguru import logger  # noqa
-import json
 from pathlib import Path
+from mkvresort.cache import IdentifyCache
 from mkvresort.args import InputPathChecker, OutputPathChecker, PresetPathChecker
 from mkvresort.helper import (
-    find_in_dict,
-    split_list_of_dicts_by_key,
+    copy_file_atomic,
+    group_by_key,
+    is_matroska,
+    loads_json,
     combine_arguments_by_batch,
 )
 
 
+def _streams_by_type(tracks: list) -> dict:
+    """
+    Groups the tracks of an MKV file by codec type.
+
+    Args:
+        tracks (list): The tracks as reported by MKVmerge identify.
+
+    Returns:
+        dict: A dictionary of streams sorted by codec type, see `mkvmerge_identify_streams`.
+    """
+
+    # Split by codec_type
+    by_type = group_by_key(tracks, "type")
+
+    # Streams & count per codec type, sorted to video - audio - subtitles
+    streams = {}
+    for codec_type in ("video", "audio", "subtitles"):
+        streams_for_type = by_type.get(codec_type, [])
+        streams[codec_type] = {
+            "streams": streams_for_type,
+            "count": len(streams_for_type),
+        }
+
+    return streams
+
+
+# Track properties that `_enzyme_identify` reports in the same way as MKVmerge identify
+ENZYME_PROPERTIES = frozenset(
+    {
+        "number",
+        "language",
+        "default_track",
+        "forced_track",
+        "enabled_track",
+        "track_name",
+        "codec_id",
+    }
+)
+
+
+# MKVmerge identify names of the Matroska track types that are resorted
+TRACK_TYPES = {1: "video", 2: "audio", 17: "subtitles"}
+
+
+@functools.cache
+def _import_enzyme():
+    """
+    Imports enzyme on first use, so that it is only loaded when streams actually need to be identified.
+
+    Returns:
+        module or None: The enzyme module, or None if it is not installed.
+    """
+
+    try:
+        import enzyme  # type: ignore
+        import enzyme.parsers.ebml  # type: ignore  # noqa: F401
+    except ImportError:
+        return None
+
+    return enzyme
+
+
+def _enzyme_identify(input_file) -> dict:
+    """
+    Identifies the streams in an MKV file in-process using the EBML parser of enzyme, without starting an MKVmerge
+    process.
+
+    The track entries are converted to the format of MKVmerge identify. Like MKVmerge, track IDs are assigned in the
+    order of the track entries in the file, counting tracks of every type. Only the properties in `ENZYME_PROPERTIES`
+    are reported.
+
+    Args:
+        input_file (str): The path to the MKV file to identify.
+
+    Returns:
+        dict: A dictionary of streams sorted by codec type, see `mkvmerge_identify_streams`.
+
+    Raises:
+        ValueError: If enzyme is not installed or the file has no tracks that can be found through its SeekHead.
+    """
+
+    enzyme = _import_enzyme()
+    if enzyme is None:
+        raise ValueError("Enzyme is not installed")
+
+    ebml = enzyme.parsers.ebml
+    specs = ebml.get_matroska_specs()
+    ignore_element_names = ["Void", "CRC-32"]
+
+    with open(input_file, "rb") as file:
+        segments = ebml.parse(file, specs, ignore_element_names=["EBML"], max_level=0)
+        if not segments:
+            raise ValueError("No Segment found")
+        segment = segments[0]
+
+        file.seek(segment.position)
+        seek_head = ebml.parse_element(file, specs)
+        if seek_head.name != "SeekHead":
+            raise ValueError("No SeekHead found")
+        seek_head.load(file, specs, ignore_element_names=ignore_element_names)
+
+        track_entries = None
+        for seek in seek_head:
+            element_id = ebml.read_element_id(seek["SeekID"].data)
+            if specs[element_id][1] == "Tracks":
+                file.seek(segment.position + seek["SeekPosition"].data)
+                track_entries = ebml.parse_element(
+                    file, specs, True, ignore_element_names=ignore_element_names
+                )
+                break
+
+    if track_entries is None:
+        raise ValueError("No Tracks found")
+
+    tracks = []
+    for track_id, track_entry in enumerate(track_entries):
+        properties = {
+            "number": track_entry.get("TrackNumber"),
+            "language": track_entry.get("Language", "eng"),
+            "default_track": bool(track_entry.get("FlagDefault", 1)),
+            "forced_track": bool(track_entry.get("FlagForced", 0)),
+            "enabled_track": bool(track_entry.get("FlagEnabled", 1)),
+        }
+        if "Name" in track_entry:
+            properties["track_name"] = track_entry.get("Name")
+        if "CodecID" in track_entry:
+            properties["codec_id"] = track_entry.get("CodecID")
+
+        tracks.append(
+            {
+                "id": track_id,
+                "type": TRACK_TYPES.get(track_entry.get("TrackType")),
+                "properties": properties,
+            }
+        )
+
+    return _streams_by_type(tracks)
+
+
+def _mkvmerge_identify(input_file, process: ProcessCommand):
+    """
+    Runs MKVmerge identify for a single file and returns a dictionary of streams sorted by codec type.
+
+    Args:
+        input_file (str): The path to the MKV file to identify.
+        process (ProcessCommand): The process command used for running MKVmerge.
+
+    Returns:
+        dict: A dictionary of streams sorted by codec type, see `mkvmerge_identify_streams`.
+    """
+
+    mkvmerge_identify_command = [
+        "mkvmerge",
+        "--identify",
+        "--identification-format",
+        "json",
+        str(input_file),
+    ]
+
+    result = process.run("MKVmerge identify", mkvmerge_identify_command)
+
+    mkvmerge_identify_output = loads_json(result.stdout)
+
+    return _streams_by_type(mkvmerge_identify_output["tracks"])
+
+
+def _identify(input_file, process: ProcessCommand, backends: tuple) -> tuple:
+    """
+    Identifies the streams in an MKV file with the first of the given backends that succeeds.
+
+    Args:
+        input_file (str): The path to the MKV file to identify.
+        process (ProcessCommand): The process command used for running MKVmerge.
+        backends (tuple): The backends that may be used, "enzyme" and/or "mkvmerge". MKVmerge is always used if
+        enzyme fails.
+
+    Returns:
+        tuple: The name of the backend that identified the streams, and a dictionary of streams sorted by codec type,
+        see `mkvmerge_identify_streams`.
+    """
+
+    if "enzyme" in backends:
+        try:
+            return "enzyme", _enzyme_identify(input_file)
+        except Exception as error:  # noqa: BLE001
+            # Enzyme raises all kinds of errors on damaged headers, which MKVmerge may still be able to read
+            logger.info(
+                f"Enzyme identify for `{input_file}` failed, using MKVmerge: {error!r}"
+            )
+
+    return "mkvmerge", _mkvmerge_identify(input_file, process)
+
+
 def mkvmerge_identify_streams(
-    input_file, total_items, item_index, batch_index, batch_name
+    input_file,
+    process: ProcessCommand,
+    identify_cache: IdentifyCache | None = None,
+    properties: frozenset | None = None,
 ):
     """
     Identifies the streams in an MKV file using MKVmerge and returns a dictionary of streams sorted by codec type.
 
     Args:
         input_file (str): The path to the MKV file to identify.
-        total_items (int): The total number of items in the batch.
-        item_index (int): The index of the current item in the batch.
-        batch_index (int): The index of the current batch.
-        batch_name (str): The name of the current batch.
+        process (ProcessCommand): The process command used for running MKVmerge.
+        identify_cache (IdentifyCache, optional): The cache used for looking up and storing identified streams.
+        Defaults to None.
+        properties (frozenset, optional): The track properties the streams will be sorted on. Enzyme is only used
+        when all of them are in `ENZYME_PROPERTIES`. Defaults to None, in which case only MKVmerge is used.
 
     Returns:
         dict: A dictionary of streams sorted by codec type, with the following structure:
@@ -34,54 +238,58 @@ def mkvmerge_identify_streams(
                 - "count": The number of streams of the given codec type.
     """
 
-    if item_index == 0:
-        logger.info(
-            f"MKVmerge identify batch `{batch_index}` for `{batch_name}` started."
-        )
+    backends: tuple = ("mkvmerge",)
+    if (
+        properties is not None
+        and properties <= ENZYME_PROPERTIES
+        and _import_enzyme() is not None
+    ):
+        backends = ("enzyme", "mkvmerge")
+
+    streams = None
+    if identify_cache is not None:
+        streams = identify_cache.get(input_file, backends)
+
+    if streams is None:
+        backend, streams = _identify(input_file, process, backends)
+        if identify_cache is not None:
+            identify_cache.set(input_file, streams, backend)
+    else:
+        logger.info(f"Streams of `{input_file}` loaded from cache.")
 
-    mkvmerge_identify_command = [
-        "mkvmerge",
-        "--identify",
-        "--identification-format",
-        "json",
-        str(input_file),
-    ]
+    return streams
 
-    process = ProcessCommand(logger)
-    result = process.run("MKVmerge identify", mkvmerge_identify_command)
 
-    mkvmerge_identify_output = json.loads(result.stdout)
+def _output_file(input_file: Path, output_path: Path, new_file_suffix=" (1)") -> str:
+    """
+    Returns the path of the output file for an input file.
 
-    # Split by codec_type
-    split_streams, split_keys = split_list_of_dicts_by_key(
-        mkvmerge_identify_output["tracks"], "type"
-    )
+    Args:
+        input_file (Path): The path to the MKV file to resort.
+        output_path (Path): The path to the output directory or file.
+        new_file_suffix (str, optional): The suffix to add to the output file. Defaults to " (1)".
 
-    # Rebuild streams & count per codec type
-    streams = {k: {"streams": {}, "count": 0} for k in split_keys}
-    for x, s in enumerate(split_keys):
-        streams[s]["streams"] = split_streams[x]
-        streams[s]["count"] = len(streams[s]["streams"])
+    Returns:
+        str: The path to the output file.
+    """
 
-    # Sort streams to video - audio - subtitles
-    streams = {k: streams[k] for k in ["video", "audio", "subtitles"]}
+    # Output extension
+    output_extension = ".mkv"
 
-    if item_index == total_items - 1:
-        logger.info(
-            f"MKVmerge identify batch `{batch_index}` for `{batch_name}` completed."
+    # Prepare output file name
+    if output_path.is_dir():
+        return str(
+            output_path.joinpath(input_file.stem + new_file_suffix + output_extension)
         )
 
-    return streams
+    return str(output_path.with_suffix("").with_suffix(output_extension))
 
 
 def mkvmerge_resort_streams(
     input_file: Path,
     output_path: Path,
     track_order,
-    total_items,
-    item_index,
-    batch_index,
-    batch_name,
+    process: ProcessCommand,
     new_file_suffix=" (1)",
 ):
     """
@@ -91,59 +299,84 @@ def mkvmerge_resort_streams(
         input_file (Path): The path to the MKV file to resort.
         output_path (Path): The path to the output directory.
         track_order (list): The order of the tracks to resort.
-        total_items (int): The total number of items in the batch.
-        item_index (int): The index of the current item in the batch.
-        batch_index (int): The index of the current batch.
-        batch_name (str): The name of the current batch.
+        process (ProcessCommand): The process command used for running MKVmerge.
         new_file_suffix (str, optional): The suffix to add to the output file. Defaults to " (1)".
 
     Returns:
         None
     """
 
-    if item_index == 0:
+    output_file = _output_file(input_file, output_path, new_file_suffix)
+
+    if track_order == list(range(len(track_order))) and is_matroska(input_file):
+        # Streams are already in order, so remuxing would only copy the file
         logger.info(
-            f"MKVmerge resort streams batch `{batch_index}` for `{batch_name}` started."
+            f"Streams of `{input_file}` are already in order, copying without resort."
         )
+        copy_file_atomic(input_file, Path(output_file))
+    else:
+        track_order_args = ",".join(map("0:{}".format, track_order))
 
-    track_order_args = ",".join(["0:" + str(v) for v in track_order])
+        mkvmerge_resort_command = [
+            "mkvmerge",
+            "--output",
+            output_file,
+            "(",
+            str(input_file),
+            ")",
+            "--track-order",
+            track_order_args,
+        ]
 
-    # Output extension
-    output_extension = ".mkv"
+        process.run("MKVmerge resort", mkvmerge_resort_command)
 
-    # Prepare output file name
-    if output_path.is_dir():
-        output_file = str(
-            output_path.joinpath(input_file.stem + new_file_suffix + output_extension)
-        )
-    else:
-        output_file = str(output_path.with_suffix("").with_suffix(output_extension))
 
-    mkvmerge_resort_command = [
-        "mkvmerge",
-        "--output",
-        output_file,
-        "(",
-        str(input_file),
-        ")",
-        "--track-order",
-        track_order_args,
-    ]
+class _Descending:
+    """
+    Wraps a value so that it is ordered in reverse when used in a sort key.
 
-    process = ProcessCommand(logger)
-    process.run("MKVmerge resort", mkvmerge_resort_command)
+    Args:
+        value: The value to be wrapped.
+    """
+
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __lt__(self, other):
+        return other.value < self.value
 
-    if item_index != total_items - 1:
-        return
 
-    logger.info(
-        f"MKVmerge resort streams batch `{batch_index}` for `{batch_name}` completed."
-    )
+def _sort_value(value, reverse: bool):
+    """
+    Returns the value to be used in a sort key, so that it is ordered in reverse if requested.
+
+    Args:
+        value: The value to be sorted on.
+        reverse (bool): Whether the value should be ordered in reverse.
+
+    Returns:
+        The value itself, the negated value for numbers, or the value wrapped in `_Descending`.
+    """
+
+    if not reverse:
+        return value
+
+    if isinstance(value, (int, float)):
+        return -value
+
+    return _Descending(value)
 
 
 def multisort_by_preset(streams: list, preset: dict) -> list:
     """
-    Sorts a list of dictionaries in descending order based on the specified keys in the `specs` dictionary.
+    Sorts a list of dictionaries in place based on the specified keys in the `preset` dictionary.
+
+    The list is sorted once using a tuple key, in which later keys of the preset take precedence over earlier keys.
 
     Args:
         streams (list): The list of dictionaries to be sorted.
@@ -154,20 +387,93 @@ def multisort_by_preset(streams: list, preset: dict) -> list:
         list: The sorted list of dictionaries.
     """
 
-    for key, reverse in list(preset.items()):
-        streams.sort(
-            key=lambda nx: nx["properties"][key] if key in nx["properties"] else "",
-            reverse=reverse,
+    spec = list(reversed(preset.items()))
+
+    decorated = []
+    for stream in streams:
+        properties = stream["properties"]
+        sort_key = tuple(
+            _sort_value(properties.get(key, ""), reverse) for key, reverse in spec
         )
+        decorated.append((sort_key, stream))
+
+    decorated.sort(key=operator.itemgetter(0))
+    streams[:] = [stream for _, stream in decorated]
 
     return streams
 
 
+def _log_batch_started(started: set, item: dict, action: str) -> None:
+    """
+    Logs the start of a batch the first time a task of the batch is started for the given action.
+
+    Args:
+        started (set): The actions and batches that have already been logged as started.
+        item (dict): The batch item the task belongs to.
+        action (str): The action that is performed on the file, used in the log message.
+
+    Returns:
+        None
+    """
+
+    batch = item["batch"]
+    if (action, batch) in started:
+        return
+
+    started.add((action, batch))
+    logger.info(f"{action} batch `{batch}` for `{item['input']['given']}` started.")
+
+
+def _log_batch_progress(remaining: dict, item: dict, action: str) -> None:
+    """
+    Counts a file of a batch as done, and logs the completion of the batch once all of its files are done.
+
+    Args:
+        remaining (dict): The amount of files that are not done yet, per batch.
+        item (dict): The batch item the file belongs to.
+        action (str): The action that was performed on the file, used in the log message.
+
+    Returns:
+        None
+    """
+
+    batch = item["batch"]
+
+    remaining[batch] -= 1
+    if remaining[batch] == 0:
+        logger.info(
+            f"{action} batch `{batch}` for `{item['input']['given']}` completed."
+        )
+
+
+def _track_order(streams: dict, preset: dict) -> list:
+    """
+    Determines the track order for the identified streams of a file based on the preset.
+
+    Args:
+        streams (dict): The identified streams of a file, sorted by codec type.
+        preset (dict): A dictionary containing the keys and their corresponding sorting order.
+
+    Returns:
+        list: The stream IDs in the order they should be resorted to.
+    """
+
+    to_be_resorted: list = []
+    for stream_info in streams:
+        sorted_list_by_preset = multisort_by_preset(
+            list(streams[stream_info]["streams"]), preset
+        )
+        to_be_resorted += [stream_item["id"] for stream_item in sorted_list_by_preset]
+
+    return to_be_resorted
+
+
 @logger.catch
 @click.command(
-    context_settings={"help_option_names": ["-h", "--help"]},
+    add_help_option=False,
     epilog="Repository: https://github.com/ToshY/mkvresort",
 )
+@click.help_option("-h", "--help")
 @click.option(
     "--input-path",
     "-i",
@@ -175,6 +481,7 @@ def multisort_by_preset(streams: list, preset: dict) -> list:
     required=False,
     multiple=True,
     callback=InputPathChecker(),
+    is_eager=True,
     show_default=True,
     default=["./input"],
     help="Path to input file or directory",
@@ -201,79 +508,126 @@ def multisort_by_preset(streams: list, preset: dict) -> list:
     show_default=True,
     help="Path to JSON file containing field name and direction for sorting streams",
 )
-def cli(input_path, output_path, preset):
+@click.option(
+    "--jobs",
+    "-j",
+    type=click.IntRange(min=1),
+    required=False,
+    show_default=True,
+    default=min(os.cpu_count() or 1, 8),
+    help="Maximum amount of identify and resort tasks to run concurrently, combined",
+)
+@click.option(
+    "--no-cache",
+    is_flag=True,
+    default=False,
+    help="Do not use cached MKVmerge identify results",
+)
+def cli(input_path, output_path, preset, jobs, no_cache):
     combined_result = combine_arguments_by_batch(input_path, output_path, preset)
+    identify_cache = None if no_cache else IdentifyCache(logger)
+    process = ProcessCommand(logger)
 
-    # Identify track order
-    for item in combined_result:
-        current_batch = item.get("batch")
-        current_preset = item.get("preset")
-        current_input_original_batch_name = item.get("input").get("given")
-        current_input_files = item.get("input").get("resolved")
-        total_current_input_files = len(current_input_files)
-
-        to_be_resorted_for_batch = []
-        for current_file_path_index, current_file_path in enumerate(
-            current_input_files
-        ):
-            mkvmerge_identify_result = mkvmerge_identify_streams(
-                current_file_path,
-                total_current_input_files,
-                current_file_path_index,
-                current_batch,
-                current_input_original_batch_name,
+    identify_tasks = [
+        (item, current_file_path)
+        for item in combined_result
+        for current_file_path in item.get("input").get("resolved")
+    ]
+
+    # Files are identified and resorted concurrently, so every file needs its own output file
+    # that is not also an input file
+    input_files = {str(current_file_path) for _, current_file_path in identify_tasks}
+    output_files: dict = {}
+    for item, current_file_path in identify_tasks:
+        output_file = _output_file(
+            current_file_path, item.get("output").get("resolved")
+        )
+        if output_file in input_files:
+            raise click.BadParameter(
+                f"The output file `{output_file}` for input file "
+                f"`{current_file_path}` is also an input file.",
+                param_hint="'--output-path' / '-o'",
             )
+        if output_file in output_files:
+            raise click.BadParameter(
+                f"The input files `{output_files[output_file]}` and "
+                f"`{current_file_path}` would both be written to output file "
+                f"`{output_file}`.",
+                param_hint="'--output-path' / '-o'",
+            )
+        output_files[output_file] = current_file_path
+
+    # Identify each file once, also when it is part of multiple batches
+    items_by_file: dict = {}
+    properties_by_file: dict = {}
+    for item, current_file_path in identify_tasks:
+        items_by_file.setdefault(current_file_path, []).append(item)
+
+        # The track properties the file is sorted on, by any of its batches
+        properties_by_file[current_file_path] = properties_by_file.get(
+            current_file_path, frozenset()
+        ).union(item.get("preset"))
+
+    # Files per batch that still have to be identified and resorted
+    identify_remaining = {
+        item.get("batch"): len(item.get("input").get("resolved"))
+        for item in combined_result
+    }
+    resort_remaining = dict(identify_remaining)
+    started: set = set()
+
+    identify_queue = deque(items_by_file)
+    resort_queue: deque = deque()
+
+    # At most `jobs` identify and resort tasks run at the same time. Queued resorts are started before further files
+    # are identified, so each file is resorted as soon as possible after its track order has been identified.
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        running: dict = {}
+        while identify_queue or resort_queue or running:
+            while len(running) < jobs and (resort_queue or identify_queue):
+                if resort_queue:
+                    item, current_file_path, track_order = resort_queue.popleft()
+                    _log_batch_started(started, item, "MKVmerge resort streams")
+
+                    future = executor.submit(
+                        mkvmerge_resort_streams,
+                        current_file_path,
+                        item.get("output").get("resolved"),
+                        track_order,
+                        process,
+                    )
+                    running[future] = ("resort", item)
+                    continue
+
+                current_file_path = identify_queue.popleft()
+                for item in items_by_file[current_file_path]:
+                    _log_batch_started(started, item, "MKVmerge identify")
+
+                future = executor.submit(
+                    mkvmerge_identify_streams,
+                    current_file_path,
+                    process,
+                    identify_cache,
+                    properties_by_file[current_file_path],
+                )
+                running[future] = ("identify", current_file_path)
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                action, task = running.pop(future)
+                result = future.result()
+
+                if action == "resort":
+                    _log_batch_progress(
+                        resort_remaining, task, "MKVmerge resort streams"
+                    )
+                    continue
 
-            to_be_resorted = []
-            for stream_info in mkvmerge_identify_result:
-                streams_for_type = mkvmerge_identify_result[stream_info]["streams"]
-                streams_for_type_ids = [
-                    stream_item["id"] for stream_item in streams_for_type
-                ]
-
-                sorted_list_by_preset = multisort_by_preset(
-                    streams_for_type, current_preset
-                )  # noqa
-
-                for current_stream_index, current_stream in enumerate(
-                    streams_for_type_ids
-                ):
-                    found_index = find_in_dict(
-                        input_list=sorted_list_by_preset, key="id", value=current_stream
+                for item in items_by_file[task]:
+                    _log_batch_progress(identify_remaining, item, "MKVmerge identify")
+                    resort_queue.append(
+                        (item, task, _track_order(result, item.get("preset")))
                     )
-                    if current_stream_index != found_index:
-                        (
-                            streams_for_type_ids[current_stream_index],
-                            streams_for_type_ids[found_index],
-                        ) = (
-                            streams_for_type_ids[found_index],
-                            streams_for_type_ids[current_stream_index],
-                        )
-
-                to_be_resorted = to_be_resorted + streams_for_type_ids
-
-            to_be_resorted_for_batch.append(to_be_resorted)
-
-        item["track_order"] = to_be_resorted_for_batch
-
-    # Resort
-    for item in combined_result:
-        current_batch = item.get("batch")
-        current_track_order = item.get("track_order")
-        current_output = item.get("output").get("resolved")
-        current_input_original_batch_name = item.get("input").get("given")
-        current_input_files = item.get("input").get("resolved")
-        total_current_input_files = len(current_input_files)
-
-        for current_file_path_index, current_file_path in enumerate(
-            current_input_files
-        ):
-            mkvmerge_resort_streams(
-                current_file_path,
-                current_output,
-                current_track_order[current_file_path_index],
-                total_current_input_files,
-                current_file_path_index,
-                current_batch,
-                current_input_original_batch_name,
-            )
+
+    if identify_cache is not None:
+        identify_cache.prune()
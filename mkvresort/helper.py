@@ -1,36 +1,91 @@
-import collections
 import fnmatch
+import functools
 import json
+import os
+import re
+import shutil
+import tempfile
 from pathlib import Path
 
+try:
+    import orjson  # type: ignore
+except ImportError:
+    orjson = None  # type: ignore
 
-def files_in_dir(path: Path, file_types=["*.mkv"]):
+
+def files_in_dir_iter(path: Path, file_types=("*.mkv",)):
+    """
+    Lazily yields the files in the given directory (recursively) that match the specified file types.
+
+    Patterns of the form `*.ext` are matched on the file name suffix, other patterns are matched with `fnmatch`. Both
+    are matched case-insensitively.
+
+    Parameters:
+        path (Path): The path to the directory.
+        file_types (Tuple[str], optional): The file types to match. Defaults to ("*.mkv",).
+
+    Yields:
+        Path: The path to a file in the directory that matches the specified file types.
+    """
+
+    simple_extensions = []
+    complex_patterns = []
+    for pattern in file_types:
+        pattern = pattern.lower()
+        if pattern.startswith("*.") and not any(c in pattern[2:] for c in "*?["):
+            simple_extensions.append(pattern[1:])
+        else:
+            complex_patterns.append(fnmatch.translate(pattern))
+
+    extensions = tuple(simple_extensions)
+
+    # Combine the remaining patterns into a single regular expression, compiled once for the whole walk
+    complex_matcher = None
+    if complex_patterns:
+        complex_matcher = re.compile("|".join(complex_patterns)).match
+
+    stack = [str(path)]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                        continue
+
+                    name = entry.name.lower()
+                    if (
+                        name.endswith(extensions)
+                        or (complex_matcher is not None and complex_matcher(name))
+                    ) and entry.is_file():
+                        yield Path(entry.path)
+        except OSError:
+            continue
+
+
+def files_in_dir(path: Path, file_types=("*.mkv",)):
     """
-    Returns a list of files in the given directory that match the specified file types.
+    Returns a list of files in the given directory (recursively) that match the specified file types.
 
     Parameters:
         path (Path): The path to the directory.
-        file_types (List[str], optional): A list of file types to match. Defaults to ["*.mkv"].
+        file_types (Tuple[str], optional): The file types to match. Defaults to ("*.mkv",).
 
     Returns:
         List[Path]: A list of paths to the files in the directory that match the specified file types.
     """
 
-    file_list = [
-        f
-        for f in path.rglob("*")
-        if any(
-            fnmatch.fnmatch(f.name.lower(), pattern.lower()) for pattern in file_types
-        )
-    ]
-
-    return file_list
+    return list(files_in_dir_iter(path, file_types))
 
 
 def read_json(path: Path) -> dict:
     """
     Reads a JSON file from the given path and returns its contents as a dictionary.
 
+    The contents are cached for as long as the modification time of the file does not change, so the returned
+    dictionary should not be modified.
+
     Parameters:
         path (Path): The path to the JSON file.
 
@@ -38,13 +93,46 @@ def read_json(path: Path) -> dict:
         dict: The contents of the JSON file as a dictionary.
     """
 
-    with path.open("r") as file:
-        data = json.load(file)
+    return _read_json_cached(str(path.resolve()), path.stat().st_mtime_ns)
+
+
+@functools.lru_cache(maxsize=32)
+def _read_json_cached(path: str, mtime_ns: int) -> dict:
+    """
+    Reads a JSON file from the given path, cached by path and modification time.
+
+    Parameters:
+        path (str): The absolute path to the JSON file.
+        mtime_ns (int): The modification time of the JSON file in nanoseconds.
+
+    Returns:
+        dict: The contents of the JSON file as a dictionary.
+    """
+
+    with open(path, "rb") as file:
+        data = loads_json(file.read())
 
     return data
 
 
-def find_in_dict(input_list: list, key: str, value: str):
+def loads_json(data: bytes | str):
+    """
+    Deserializes a JSON document, using orjson if it is installed.
+
+    Parameters:
+        data (bytes or str): The JSON document.
+
+    Returns:
+        Any: The deserialized JSON document.
+    """
+
+    if orjson is not None:
+        return orjson.loads(data)
+
+    return json.loads(data)
+
+
+def find_in_dict(input_list: list, key: str, value: str) -> int:
     """
     Find the index of the first occurrence of a dictionary with a specific key-value pair in a list of dictionaries.
 
@@ -54,15 +142,35 @@ def find_in_dict(input_list: list, key: str, value: str):
         value (str): The value to match with the key.
 
     Returns:
-        int or bool: The index of the first occurrence of the dictionary with the specified key-value pair,
-        or False if no match is found.
+        int: The index of the first occurrence of the dictionary with the specified key-value pair,
+        or -1 if no match is found.
     """
 
     for i, dic in enumerate(input_list):
         if dic[key] == value:
             return i
 
-    return False
+    return -1
+
+
+def group_by_key(list_of_dicts: list, key: str = "codec_type") -> dict:
+    """
+    Groups a list of dictionaries by the value of a specified key.
+
+    Parameters:
+        list_of_dicts (list): A list of dictionaries to be grouped.
+        key (str, optional): The key to use for grouping. Defaults to "codec_type".
+
+    Returns:
+        dict: A dictionary mapping each unique value for the specified key, in order of first occurrence, to a list
+        of the dictionaries with that value.
+    """
+
+    result: dict = {}
+    for d in list_of_dicts:
+        result.setdefault(d[key], []).append(d)
+
+    return result
 
 
 def split_list_of_dicts_by_key(
@@ -81,14 +189,10 @@ def split_list_of_dicts_by_key(
 
     """
 
-    result = collections.defaultdict(list)
-    keys = []
-    for d in list_of_dicts:
-        result[d[key]].append(d)
-        if d[key] not in keys:
-            keys.append(d[key])
+    result = group_by_key(list_of_dicts, key)
 
-    return list(result.values()), keys
+    # Dictionaries preserve insertion order, so the keys are in order of first occurrence
+    return list(result.values()), list(result.keys())
 
 
 def combine_arguments_by_batch(*lists):
@@ -102,13 +206,58 @@ def combine_arguments_by_batch(*lists):
         list: A list of dictionaries containing combined items grouped by their 'batch' key.
     """
 
-    combined = collections.defaultdict(dict)
+    combined: dict = {}
 
     for lst in lists:
         for item in lst:
             batch = item["batch"]
-            combined[batch].update(item)
+            current = combined.get(batch)
+            if current is None:
+                combined[batch] = dict(item)
+            else:
+                current.update(item)
 
-    result = [value for key, value in combined.items()]
+    return list(combined.values())
 
-    return result
+
+def is_matroska(path: Path) -> bool:
+    """
+    Checks whether a file is a Matroska file, based on the EBML header at the start of the file.
+
+    Parameters:
+        path (Path): The path to the file.
+
+    Returns:
+        bool: True if the file starts with the EBML magic number, False otherwise.
+    """
+
+    with open(path, "rb") as file:
+        return file.read(4) == b"\x1a\x45\xdf\xa3"
+
+
+def copy_file_atomic(source: Path, destination: Path) -> None:
+    """
+    Copies the source file to the destination through a temporary file in the destination directory.
+
+    The temporary file is moved into place with `os.replace`, so an existing destination file is replaced instead of
+    written to. This never modifies a file that the destination shares an inode with, e.g. through a hard link.
+
+    Parameters:
+        source (Path): The path to the source file.
+        destination (Path): The path to the destination file.
+
+    Returns:
+        None
+    """
+
+    file_descriptor, temporary_file = tempfile.mkstemp(
+        dir=destination.parent, prefix=f".{destination.name}.", suffix=".tmp"
+    )
+    os.close(file_descriptor)
+
+    try:
+        shutil.copy2(source, temporary_file)
+        os.replace(temporary_file, destination)
+    except BaseException:
+        os.unlink(temporary_file)
+        raise
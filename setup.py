@@ -2,26 +2,24 @@ from setuptools import setup, find_packages  # type: ignore
 import os
 
 VERSION = "1.0.2"
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def read_file(filename):
+    with open(os.path.join(HERE, filename), encoding="utf-8", mode="r") as file:
+        return file.read()
 
 
 def parse_requirements(filename):
-    with open(
-        os.path.join(os.path.dirname(os.path.abspath(__file__)), filename),
-        encoding="utf-8",
-        mode="r",
-    ) as file:
-        return [
-            line.strip() for line in file if line.strip() and not line.startswith("#")
-        ]
+    return [
+        line.strip()
+        for line in read_file(filename).splitlines()
+        if line.strip() and not line.startswith("#")
+    ]
 
 
 def parse_long_description():
-    with open(
-        os.path.join(os.path.dirname(os.path.abspath(__file__)), "README.md"),
-        encoding="utf8",
-        mode="r",
-    ) as fp:
-        return fp.read()
+    return read_file("README.md")
 
 
 setup(
@@ -47,6 +45,7 @@ setup(
     install_requires=parse_requirements("requirements.txt"),
     extras_require={
         "dev": parse_requirements("requirements.dev.txt"),
+        "fast": parse_requirements("requirements.fast.txt"),
     },
     python_requires=">=3.11",
 )